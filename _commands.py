@@ -0,0 +1,87 @@
+"""
+Shared command helpers for plugins.
+
+Not a plugin itself (the leading underscore keeps the plugin loader away), import with::
+
+    from plugins._commands import parse_command
+
+To compare per-event dispatch overhead with responses rendered per call::
+
+    $ python -m plugins._commands [iterations]
+"""
+
+
+from collections import namedtuple
+import shlex
+
+
+Command = namedtuple("Command", ["alias", "name", "args"])
+
+
+def parse_command(bot, event):
+    """
+    Split the event text (respecting quotes) into a :class:`Command`, stripping the alias if
+    present.  Aliases match case-insensitively, as with the bot's own dispatch.
+    """
+    tokens = shlex.split(event.text)
+    try:
+        aliases = bot.memory.get_by_path(["bot.command_aliases"])
+    except KeyError:
+        aliases = ["/bot"]
+    alias = None
+    if tokens and tokens[0].lower() in (name.lower() for name in aliases):
+        alias = tokens.pop(0)
+    return Command(alias, tokens[0].lower() if tokens else None, tuple(tokens[1:]))
+
+
+if __name__ == "__main__":
+
+    from argparse import ArgumentParser
+    from timeit import timeit
+
+    parser = ArgumentParser()
+    parser.add_argument("iterations", type=int, nargs="?", default=100000)
+    args = parser.parse_args()
+
+    class Memory(object):
+        def __init__(self, data):
+            self.data = data
+        def get(self, key):
+            return self.data[key]
+        def get_by_path(self, path):
+            return self.data[path[0]]
+
+    class Bot(object):
+        memory = Memory({"bot.command_aliases": ["/bot", "/b"]})
+
+    class Event(object):
+        def __init__(self, text):
+            self.text = text
+
+    bot = Bot()
+    levels = [None] + ["{0},000 AP".format(lv) for lv in range(1, 17)]
+    level_table = "\n".join("<b>L{0}:</b> {1}".format(lv, levels[lv]) for lv in range(2, 17))
+    usage = "Usage: /bot calendar show <i>pos</i>"
+    rendered = usage.replace("/bot", bot.memory.get("bot.command_aliases")[0])
+
+    # Each iteration is a fresh event, as with real dispatch.
+    def calendar_before():
+        shlex.split(Event("/bot calendar show").text)[2:]
+        usage.replace("/bot", bot.memory.get("bot.command_aliases")[0])
+
+    def calendar_after():
+        parse_command(bot, Event("/bot calendar show")).args
+        rendered
+
+    def level_before():
+        "\n".join("<b>L{0}:</b> {1}".format(lv, levels[lv]) for lv in range(2, 17))
+
+    def level_after():
+        level_table
+
+    for name, func in (("calendar usage, rendered per call", calendar_before),
+                       ("calendar usage, pre-rendered", calendar_after),
+                       ("level table, rendered per call", level_before),
+                       ("level table, pre-rendered", level_after)):
+        secs = timeit(func, number=args.iterations)
+        print("{0}: {1:.2f}us per dispatch".format(name, secs / args.iterations * 1e6))
@@ -0,0 +1,107 @@
+"""
+Shared image uploads for plugins.
+
+Not a plugin itself (the leading underscore keeps the plugin loader away), import with::
+
+    from plugins._media import uploader
+
+Config keys:
+
+    - `media.workers` [global]: maximum concurrent uploads (defaults to 4)
+"""
+
+
+import asyncio
+from collections import Counter
+import hashlib
+import logging
+import mmap
+import os
+import time
+import types
+
+
+log = logging.getLogger(__name__)
+
+
+def _digest(path):
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if not size:
+            # Empty files can't be mapped, and aren't images anyway.
+            raise ValueError("Can't upload empty file {0}".format(path))
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            return hashlib.sha1(data).hexdigest(), size
+
+
+class Uploader(object):
+    """
+    Uploads local images with a bounded number in flight.  Concurrent requests for identical
+    content share a single upload, which runs as its own task so it outlives any one requester
+    being cancelled.  Running totals are kept in :attr:`stats` and logged after each upload.
+    """
+
+    def __init__(self, workers=4):
+        self.workers = workers
+        self.pool = None
+        self.pending = {}
+        self.stats = Counter()
+
+    def _acquire(self):
+        # Wrapped in a future so plain generators can wait on it.
+        acquire = asyncio.ensure_future(self.pool.acquire())
+        try:
+            yield from acquire
+        except BaseException:
+            if acquire.done() and not acquire.cancelled():
+                self.pool.release()
+            raise
+
+    def _upload(self, bot, path, filename):
+        # Only opened once a pool slot is held, so queued requests don't tie up file handles.
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            return (yield from asyncio.ensure_future(bot._client.upload_image(data, filename=filename)))
+
+    @types.coroutine # lets ensure_future run it as a task
+    def _run(self, bot, path, filename, size):
+        yield from self._acquire()
+        try:
+            start = time.monotonic()
+            image = yield from self._upload(bot, path, filename)
+            latency = time.monotonic() - start
+        finally:
+            self.pool.release()
+        self.stats["uploads"] += 1
+        self.stats["bytes_uploaded"] += size
+        self.stats["latency"] += latency
+        log.info("Uploaded {0} in {1:.2f}s ({2} uploads, {3} deduplicated, {4} bytes uploaded, "
+                 "{5} bytes saved, {6:.2f}s average)"
+                 .format(path, latency, self.stats["uploads"], self.stats["deduplicated"],
+                         self.stats["bytes_uploaded"], self.stats["bytes_saved"],
+                         self.stats["latency"] / self.stats["uploads"]))
+        return image
+
+    def _done(self, digest, path, task):
+        del self.pending[digest]
+        if not task.cancelled() and task.exception():
+            log.error("Failed to upload {0}: {1!r}".format(path, task.exception()))
+
+    def upload_file(self, bot, path, filename=None):
+        """Upload an image from disk, returning its image ID."""
+        if self.pool is None:
+            self.pool = asyncio.Semaphore(bot.get_config_option("media.workers") or self.workers)
+        digest, size = _digest(path)
+        try:
+            task = self.pending[digest]
+        except KeyError:
+            task = asyncio.ensure_future(self._run(bot, path, filename or os.path.basename(path), size))
+            self.pending[digest] = task
+            task.add_done_callback(lambda task: self._done(digest, path, task))
+        else:
+            self.stats["deduplicated"] += 1
+            self.stats["bytes_saved"] += size
+            log.debug("Sharing in-flight upload of {0}".format(path))
+        return (yield from asyncio.shield(task))
+
+
+uploader = Uploader()
@@ -1,6 +1,28 @@
+"""
+Cake leaderboards.
+
+Old cake is moved out of conversation memory into a per-chat archive file (one JSON entry per
+line), with only the totals kept in memory.  Memory also records which archive file is current
+and how much of it has been saved, so an archival interrupted before the memory save is
+discarded and redone rather than counted twice.  Admins can export and import the full ledger,
+using files in the `exports` subdirectory.
+
+Config keys:
+
+    - `cake.archive` [global]: directory for archive files (defaults to `cake`
+      alongside the memory file)
+    - `cake.archive_days` [global]: age in days before cake is archived (defaults to 90,
+      `0` disables archival)
+"""
+
+
 from collections import Counter
+from copy import deepcopy
+import json
 import logging
+import os
 import re
+import time
 
 from emoji import emojize
 
@@ -10,6 +32,9 @@ import utils
 
 log = logging.getLogger(__name__)
 
+# Default age (in days) after which entries are moved from memory to the archive file.
+ARCHIVE_DAYS = 90
+
 
 def _get_users(bot, conv):
     users = bot.get_users_in_conversation(conv.id_)
@@ -62,12 +87,95 @@ def _match_name(search, names, angel):
 def _show_name(uid, names):
     try:
         return names[uid][0]
-    except IndexError:
+    except (KeyError, IndexError):
         return "<i>{0}</i>".format(uid)
 
 
+def _archive_dir(bot):
+    path = bot.get_config_option("cake.archive")
+    if not path:
+        path = os.path.join(os.path.dirname(bot.memory.filename), "cake")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+def _archive_path(bot, conv_id, summary):
+    return os.path.join(_archive_dir(bot), summary.get("file") or "{0}.jsonl".format(conv_id))
+
+def _export_path(bot, name):
+    # Exports get their own directory, so they can't overwrite any conversation's archive.
+    if os.path.isabs(name) or ".." in name.replace("\\", "/").split("/"):
+        raise ValueError("File names must be relative to the exports directory.")
+    path = os.path.join(_archive_dir(bot), "exports")
+    os.makedirs(path, exist_ok=True)
+    return os.path.join(path, name)
+
+def _cutoff(bot):
+    days = bot.get_config_option("cake.archive_days")
+    if days is None:
+        days = ARCHIVE_DAYS
+    return time.time() - days * 60 * 60 * 24 if days else None
+
+def _is_old(entry, cutoff):
+    # Entries from before timestamps were recorded are treated as old.
+    return cutoff is not None and (len(entry) < 3 or entry[2] < cutoff)
+
+def _dump_entry(entry):
+    return json.dumps(entry, separators=(",", ":")) + "\n"
+
+def _load_entry(line):
+    entry = json.loads(line)
+    if (not isinstance(entry, list) or len(entry) not in (2, 3) or
+            not all(isinstance(uid, str) for uid in entry[:2]) or
+            (len(entry) == 3 and (isinstance(entry[2], bool) or not isinstance(entry[2], (int, float))))):
+        raise ValueError("Not a cake entry: {0}".format(line.strip()))
+    return entry
+
+def _get_summary(bot, conv_id):
+    # A copy, so nothing changes in memory until the ledger is saved.
+    summary = bot.conversation_memory_get(conv_id, "cake_archived")
+    return deepcopy(summary) if summary else {"angels": {}, "hoarders": {}}
+
+def _tally(summary, angel, hoarder):
+    summary["angels"][angel] = summary["angels"].get(angel, 0) + 1
+    summary["hoarders"][hoarder] = summary["hoarders"].get(hoarder, 0) + 1
+
+def _save_ledger(bot, conv_id, cakes, summary):
+    # Both keys in one save, which commits any archive file writes made beforehand.
+    if not bot.memory.exists(["conv_data"]):
+        bot.memory.set_by_path(["conv_data"], {})
+    if not bot.memory.exists(["conv_data", conv_id]):
+        bot.memory.set_by_path(["conv_data", conv_id], {})
+    bot.memory.set_by_path(["conv_data", conv_id, "cake"], cakes)
+    bot.memory.set_by_path(["conv_data", conv_id, "cake_archived"], summary)
+    bot.memory.save()
+
+def _archive(bot, conv_id, cakes):
+    """
+    Append old entries to the conversation's archive file, returning the entries to keep and
+    the updated archive totals.  The caller saves both with :func:`_save_ledger`.
+    """
+    cutoff = _cutoff(bot)
+    summary = _get_summary(bot, conv_id)
+    keep = [entry for entry in cakes if not _is_old(entry, cutoff)]
+    if len(keep) == len(cakes):
+        return cakes, summary
+    with open(_archive_path(bot, conv_id, summary), "a") as f:
+        # Drop anything written by an earlier archival whose memory save didn't happen.
+        if summary.get("size") is not None and os.fstat(f.fileno()).st_size > summary["size"]:
+            f.truncate(summary["size"])
+        for entry in cakes:
+            if _is_old(entry, cutoff):
+                f.write(_dump_entry(entry))
+                _tally(summary, entry[0], entry[1])
+        f.flush()
+        summary["size"] = os.fstat(f.fileno()).st_size
+    log.debug("Archived {0} cake(s) for {1}".format(len(cakes) - len(keep), conv_id))
+    return keep, summary
+
+
 def _initialise(bot):
     plugins.register_user_command(["cake"])
+    plugins.register_admin_command(["cake_export", "cake_import"])
 
 
 def cake(bot, event, *args):
@@ -77,10 +185,11 @@ def cake(bot, event, *args):
     names = _get_names(bot, users)
     msg = None
     if not args:
-        if cakes:
-            angels = Counter()
-            hoarders = Counter()
-            for angel, hoarder in cakes:
+        summary = _get_summary(bot, event.conv_id)
+        if cakes or summary["angels"]:
+            angels = Counter(summary["angels"])
+            hoarders = Counter(summary["hoarders"])
+            for angel, hoarder, *_ in cakes:
                 angels[angel] += 1
                 hoarders[hoarder] += 1
             parts = ["<b>Top cake hoarders:</b>"]
@@ -101,8 +210,84 @@ def cake(bot, event, *args):
             return
         angel, hoarder = event.user.id_.chat_id, user
         log.debug("{0} gave cake to {1}".format(angel, hoarder))
-        cakes.append([angel, hoarder])
-        bot.conversation_memory_set(event.conv_id, "cake", cakes)
+        cakes.append([angel, hoarder, int(time.time())])
+        cakes, summary = _archive(bot, event.conv_id, cakes)
+        _save_ledger(bot, event.conv_id, cakes, summary)
         msg = ":heart_eyes: {0} gave a slice of :cake: to {1}!".format(_show_name(angel, names), _show_name(hoarder, names))
     if msg:
         yield from bot.coro_send_message(event.conv_id, emojize(msg, use_aliases=True))
+
+
+def cake_export(bot, event, *args):
+    """Export this conversation's cake ledger, including archived cake: <b>cake_export <i>[file]</i></b>"""
+    try:
+        path = _export_path(bot, args[0] if args else "{0}.jsonl".format(event.conv_id))
+    except ValueError as e:
+        yield from bot.coro_send_message(event.conv_id, "<i>Couldn't export cake: {0}</i>".format(e))
+        return
+    summary = _get_summary(bot, event.conv_id)
+    archive = _archive_path(bot, event.conv_id, summary)
+    cakes = bot.conversation_memory_get(event.conv_id, "cake") or []
+    count = 0
+    try:
+        # Write to a temporary file first, so a failed export leaves any existing file intact.
+        with open(path + ".tmp", "wb") as out:
+            if os.path.exists(archive):
+                with open(archive, "rb") as f:
+                    # Stop at the saved size, skipping any unsaved archival.
+                    size = summary.get("size")
+                    pos = 0
+                    for line in f:
+                        pos += len(line)
+                        if size is not None and pos > size:
+                            break
+                        out.write(line)
+                        count += 1
+            for entry in cakes:
+                out.write(_dump_entry(entry).encode("utf-8"))
+                count += 1
+        os.replace(path + ".tmp", path)
+    except OSError as e:
+        if os.path.exists(path + ".tmp"):
+            os.remove(path + ".tmp")
+        yield from bot.coro_send_message(event.conv_id, "<i>Couldn't export cake: {0}</i>".format(e))
+        return
+    yield from bot.coro_send_message(event.conv_id, "<i>Exported {0} cake(s) to <b>{1}</b>.</i>".format(count, path))
+
+def cake_import(bot, event, *args):
+    """Replace this conversation's cake ledger from an exported file: <b>cake_import <i>file</i></b>"""
+    if not args:
+        yield from bot.coro_send_message(event.conv_id, "<i>Name a file to import from.</i>")
+        return
+    old = _get_summary(bot, event.conv_id)
+    # Import into a new archive file, which only takes over once memory is saved.
+    gen = old.get("gen", 0) + 1
+    summary = {"angels": {}, "hoarders": {}, "gen": gen, "file": "{0}.{1}.jsonl".format(event.conv_id, gen)}
+    archive = _archive_path(bot, event.conv_id, summary)
+    cutoff = _cutoff(bot)
+    cakes = []
+    try:
+        path = _export_path(bot, args[0])
+        with open(path) as f, open(archive, "w") as out:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = _load_entry(line)
+                if _is_old(entry, cutoff):
+                    out.write(_dump_entry(entry))
+                    _tally(summary, entry[0], entry[1])
+                else:
+                    cakes.append(entry)
+            out.flush()
+            summary["size"] = os.fstat(out.fileno()).st_size
+    except (OSError, ValueError) as e:
+        if os.path.exists(archive):
+            os.remove(archive)
+        yield from bot.coro_send_message(event.conv_id, "<i>Couldn't import cake: {0}</i>".format(e))
+        return
+    _save_ledger(bot, event.conv_id, cakes, summary)
+    previous = _archive_path(bot, event.conv_id, old)
+    if os.path.exists(previous):
+        os.remove(previous)
+    count = len(cakes) + sum(summary["angels"].values())
+    yield from bot.coro_send_message(event.conv_id, "<i>Imported {0} cake(s) from <b>{1}</b>.</i>".format(count, path))
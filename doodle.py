@@ -1,27 +1,16 @@
 import logging
 import re
-import shlex
 
 from dateutil.parser import parse as date_parse
 import requests
 
 import plugins
+from plugins._commands import parse_command
 
 
 log = logging.getLogger(__name__)
 
 
-def _parse_args(bot, event):
-    args = shlex.split(event.text)
-    try:
-        aliases = bot.memory.get_by_path(["bot.command_aliases"])
-    except KeyError:
-        aliases = ["/bot"]
-    if args[0] in aliases:
-        args.pop(0)
-    return args
-
-
 def _initialise(bot):
     plugins.register_user_command(["doodle", "doodle_email"])
 
@@ -31,9 +20,8 @@ def doodle(bot, event, *args):
      """Use quotes to contain spaces.  Options are assumed to be dates, unless <b>+text</b> is used.<br>"""
      """Example: <i>doodle "My Event" 2016-01-01 2016-01-02 2016-01-03 +hidden</i><br>"""
      """You'll need to give Doodle an email address first -- use the <b>doodle_email</b> command to set one.""")
-    args = _parse_args(bot, event)
     kwargs = {"ifNeedBe": "true", "hidden": "false", "options[]": []}
-    for arg in args[1:]:
+    for arg in parse_command(bot, event).args:
         if arg[0] == "+":
             flag = arg[1:]
             if flag == "text":
@@ -15,7 +15,6 @@ Config keys (per-chat config goes under `conv_data.<conv_id>.gcal`):
 from datetime import date, datetime, timedelta
 from httplib2 import Http
 import logging
-import shlex
 
 from dateutil.parser import parse
 from googleapiclient.discovery import build
@@ -23,6 +22,7 @@ from oauth2client.client import OAuth2WebServerFlow
 from oauth2client.file import Storage
 
 import plugins
+from plugins._commands import parse_command
 
 
 DATE = "%Y-%m-%d"
@@ -32,6 +32,12 @@ logger = logging.getLogger(__name__)
 config = None
 api = None
 resps = {}
+USAGE = {"show": "Usage: /bot calendar show <i>pos</i>",
+         "add": "Usage: /bot calendar add <i>\"what\"</i> <i>\"when\"</i> [at <i>\"where\"</i>] [<i>\"description\"</i>]",
+         "edit": "Usage: /bot calendar edit <i>pos</i> <i>field</i> <i>\"update\"</i> [...]",
+         "remove": "Usage: /bot calendar remove <i>pos</i>",
+         None: "Unknown subcommand, try /bot help calendar."}
+usage = USAGE # with the bot's alias, rendered in _initialise
 
 
 def parse_date(d):
@@ -244,7 +250,9 @@ class Responder(object):
 
 
 def _initialise(bot):
-    global config, api
+    global config, api, usage
+    alias = bot.memory.get("bot.command_aliases")[0]
+    usage = dict((key, msg.replace("/bot", alias)) for key, msg in USAGE.items())
     config = bot.get_config_option("gcal")
     if not config or "secrets" not in config:
         logger.error("gcal: missing path to secrets file")
@@ -262,7 +270,7 @@ def calendar(bot, event, *args):
      """- /bot calendar add <i>\"what\"</i> <i>\"when\"</i> [at <i>\"where\"</i>] [<i>\"description\"</i>]<br>"""
      """- /bot calendar edit <i>pos</i> <i>field</i> <i>\"update\"</i> [...]<br>"""
      """- /bot calendar remove <i>pos</i>""")
-    args = shlex.split(event.text)[2:] # better handling of quotes
+    args = parse_command(bot, event).args # better handling of quotes
     cal_id = None
     try:
         ho_config = bot.memory.get_by_path(["conv_data", event.conv.id_, "gcal"])
@@ -277,7 +285,6 @@ def calendar(bot, event, *args):
     except KeyError:
         resp = Responder(Calendar(api, cal_id))
     msg = None
-    botalias = bot.memory.get("bot.command_aliases")[0]
     if not args:
         args = ["list"]
     if args[0] == "list":
@@ -286,26 +293,26 @@ def calendar(bot, event, *args):
         try:
             msg = resp.show(*args[1:])
         except TypeError:
-            msg = "Usage: /bot calendar show <i>pos</i>"
+            msg = usage["show"]
     elif args[0] == "add":
         try:
             msg = resp.add(*args[1:])
         except TypeError:
-            msg = "Usage: /bot calendar add <i>\"what\"</i> <i>\"when\"</i> [at <i>\"where\"</i>] [<i>\"description\"</i>]"
+            msg = usage["add"]
     elif args[0] == "edit":
         try:
             msg = resp.edit(*args[1:])
         except TypeError:
-            msg = "Usage: /bot calendar edit <i>pos</i> <i>field</i> <i>\"update\"</i> [...]"
+            msg = usage["edit"]
     elif args[0] == "remove":
         try:
             msg = resp.remove(*args[1:])
         except TypeError:
-            msg = "Usage: /bot calendar remove <i>pos</i>"
+            msg = usage["remove"]
     else:
-        msg = "Unknown subcommand, try /bot help calendar."
+        msg = usage[None]
     if msg:
-        yield from bot.coro_send_message(event.conv_id, msg.replace("/bot", botalias))
+        yield from bot.coro_send_message(event.conv_id, msg)
 
 calendar.__doc__ = calendar.__doc__.strip().replace("\n    ", "\n")
 
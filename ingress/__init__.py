@@ -4,6 +4,7 @@ import re
 import time
 
 import plugins
+from plugins._media import uploader
 
 
 def _initialise(bot):
@@ -43,7 +44,7 @@ def glyph(bot, event, *args):
     name = "-".join(args).lower()
     for filename in os.listdir(images):
         if name in filename.rsplit(".", 1)[0].split("_"):
-            image = yield from bot._client.upload_image(open(os.path.join(images, filename), "rb"), filename=filename)
+            image = yield from uploader.upload_file(bot, os.path.join(images, filename))
             yield from bot.coro_send_message(event.conv, "", image_id=image)
             break
     else:
@@ -71,13 +72,13 @@ levels = [None,
           "40M AP + 2 onyx + 4 platinum + 7 gold",
           "This information is classified."]
 
+level_msgs = ["<b>L{0}:</b> {1}".format(lv, req) for lv, req in enumerate(levels)]
+level_table = "\n".join(level_msgs[2:17])
+
 def level(bot, event, *args):
     """Displays level-up requirements, e.g. <b>level 16</b>."""
     if not args:
-        parts = []
-        for lv in range(2, 17):
-            parts.append("<b>L{0}:</b> {1}".format(lv, levels[lv]))
-        yield from bot.coro_send_message(event.conv, "\n".join(parts))
+        yield from bot.coro_send_message(event.conv, level_table)
         return
     try:
         lv = int(args[0])
@@ -86,4 +87,4 @@ def level(bot, event, *args):
     except ValueError:
         yield from bot.coro_send_message(event.conv, "Level should be a number between 2 and 16.")
         return
-    yield from bot.coro_send_message(event.conv, "<b>L{0}:</b> {1}".format(lv, levels[lv]))
+    yield from bot.coro_send_message(event.conv, level_msgs[lv])